@@ -6,10 +6,15 @@ Helps AI discover new problem spaces and startup ideas on Reddit
 
 import os
 import sys
-from typing import Any, Sequence
+from typing import Any, Iterable, Sequence
 import json
-from datetime import datetime, timedelta
 import re
+import heapq
+from collections import Counter, OrderedDict
+from itertools import groupby
+from operator import itemgetter
+import time
+import hashlib
 
 # Ensure unbuffered output for better stdio communication
 sys.stdout.reconfigure(line_buffering=True) if hasattr(sys.stdout, 'reconfigure') else None
@@ -21,27 +26,57 @@ try:
 except ImportError:
     pass
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 import praw
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent, ImageContent, EmbeddedResource
 import asyncio
+import threading
 from concurrent.futures import ThreadPoolExecutor
 
 # Thread pool for running blocking PRAW operations
-_executor = ThreadPoolExecutor(max_workers=4)
+REDDIT_WORKERS = int(os.getenv("REDDIT_WORKERS", "16"))
+_executor = ThreadPoolExecutor(max_workers=REDDIT_WORKERS, thread_name_prefix="praw")
+
+# Max Reddit API requests in flight at once, across all tool calls
+REDDIT_MAX_CONCURRENCY = int(os.getenv("REDDIT_CONCURRENCY", "8"))
+if REDDIT_MAX_CONCURRENCY < 1:
+    raise ValueError("REDDIT_CONCURRENCY must be at least 1")
+_reddit_semaphore = asyncio.Semaphore(REDDIT_MAX_CONCURRENCY)
 
 # Timeout for Reddit API operations (seconds)
 REDDIT_API_TIMEOUT = 30
 
-# Initialize Reddit client
-def get_reddit_client():
-    """Initialize and return Reddit client using PRAW"""
+# Post keyword cache: max entries, and how long (seconds) a post's extracted
+# keywords are reused. Score and comment count are always read from the post.
+POST_KEYWORD_CACHE_SIZE = 4096
+POST_KEYWORD_CACHE_TTL = 600
+
+# Max number of comment bodies whose extracted keywords are kept in memory
+COMMENT_KEYWORD_CACHE_SIZE = 16384
+
+# Tool result cache: max entries and how long a result is reused (seconds)
+TOOL_CACHE_SIZE = 1024
+TOOL_CACHE_TTL = 600
+
+def get_reddit_credentials():
+    """Return the configured Reddit client ID and secret, raising if either is missing"""
     client_id = os.getenv("REDDIT_CLIENT_ID", "")
     client_secret = os.getenv("REDDIT_CLIENT_SECRET", "")
     
     if not client_id or not client_secret:
         raise ValueError("Reddit API credentials are required. Please set REDDIT_CLIENT_ID and REDDIT_CLIENT_SECRET environment variables.")
+    return client_id, client_secret
+
+# Initialize Reddit client
+def _create_reddit_client():
+    """Initialize and return Reddit client using PRAW"""
+    client_id, client_secret = get_reddit_credentials()
     
     reddit = praw.Reddit(
         client_id=client_id,
@@ -51,16 +86,42 @@ def get_reddit_client():
     )
     return reddit
 
+# PRAW's Reddit instance and its requests session are not thread-safe, so every
+# worker thread builds its own client on first use and reuses it afterwards
+_thread_state = threading.local()
+
+def get_reddit_client():
+    """Return the calling thread's Reddit client, initializing it with PRAW on first use"""
+    reddit = getattr(_thread_state, "reddit", None)
+    if reddit is None:
+        reddit = _thread_state.reddit = _create_reddit_client()
+    return reddit
+
 async def run_blocking(func, *args, **kwargs):
     """Run blocking function in thread pool with timeout"""
-    loop = asyncio.get_event_loop()
-    return await asyncio.wait_for(
-        loop.run_in_executor(_executor, func, *args, **kwargs),
-        timeout=REDDIT_API_TIMEOUT
-    )
+    loop = asyncio.get_running_loop()
+    await _reddit_semaphore.acquire()
+    try:
+        future = _executor.submit(func, *args, **kwargs)
+    except BaseException:
+        _reddit_semaphore.release()
+        raise
+    # A timeout can't stop a request already running on a worker thread, so
+    # hold the permit until the thread is done with it, not until we stop waiting
+    future.add_done_callback(lambda _: _release_from_thread(loop))
+    return await asyncio.wait_for(asyncio.wrap_future(future), timeout=REDDIT_API_TIMEOUT)
+
+def _release_from_thread(loop):
+    """Release a Reddit concurrency permit from a worker thread's done callback"""
+    try:
+        loop.call_soon_threadsafe(_reddit_semaphore.release)
+    except RuntimeError:
+        # The loop has already closed, so nobody is waiting for the permit
+        pass
 
-def fetch_posts_sync(subreddit, method_name, limit, query=None, sort=None, time_filter=None):
-    """Synchronous helper to fetch posts from Reddit"""
+def fetch_posts_sync(subreddit_name, method_name, limit, query=None, sort=None, time_filter=None):
+    """Synchronous helper to fetch posts from Reddit on this thread's client"""
+    subreddit = get_reddit_client().subreddit(subreddit_name)
     if method_name == "search":
         if query:
             return list(subreddit.search(query, limit=limit, sort=sort or "relevance"))
@@ -77,515 +138,642 @@ def fetch_posts_sync(subreddit, method_name, limit, query=None, sort=None, time_
     else:
         return list(subreddit.hot(limit=limit))
 
-async def fetch_posts_async(subreddit, method_name, limit, query=None, sort=None, time_filter=None):
+async def fetch_posts_async(subreddit_name, method_name, limit, query=None, sort=None, time_filter=None):
     """Async wrapper for fetching posts"""
-    return await run_blocking(fetch_posts_sync, subreddit, method_name, limit, query, sort, time_filter)
+    return await run_blocking(fetch_posts_sync, subreddit_name, method_name, limit, query, sort, time_filter)
 
 # Initialize MCP Server
 app = Server("reddit-startup-ideator")
 
-def extract_problem_keywords(text: str) -> list[str]:
-    """Extract potential problem indicators from text"""
-    problem_patterns = [
-        r'\b(?:frustrated|annoying|hate|sucks|broken|doesn\'t work|wish|need|want|struggle|difficult|pain|problem|issue|bug|glitch)\w*',
-        r'\b(?:why isn\'t there|why doesn\'t|how do I|can anyone help|does anyone else|looking for|searching for)\b',
-        r'\b(?:unable to|cannot|cant|hard to|impossible|tired of|fed up with)\b',
-    ]
-    keywords = []
-    text_lower = text.lower()
-    for pattern in problem_patterns:
-        matches = re.findall(pattern, text_lower)
-        keywords.extend(matches)
-    return list(set(keywords[:10]))  # Return unique keywords, limit to 10
+# Problem indicator patterns, matched against lowercased text. They share one
+# leading word boundary and common prefixes are factored out, so a single
+# case-sensitive regex compiled at import scans each text in one pass. The
+# alternation sits in a capturing lookahead so matches may overlap, e.g. both
+# "why doesn't" and "doesn't work" are found in "why doesn't work".
+_PROBLEM_PATTERNS = [
+    r'(?:frustrated|annoying|hate|sucks|broken|doesn\'t work|wish|need|want|struggle|difficult|pain|problem|issue|bug|glitch)\w*',
+    r'(?:why (?:isn\'t there|doesn\'t)|how do i|can anyone help|does anyone else|(?:look|search)ing for)\b',
+    r'(?:unable to|can(?:no)?t|hard to|impossible|tired of|fed up with)\b',
+]
+_PROBLEM_RE = re.compile(r"\b(?=(" + "|".join(_PROBLEM_PATTERNS) + "))")
+
+# Submission ID in a post permalink (/comments/<id>/...) or short link (redd.it/<id>).
+# The lookbehind keeps media hosts like i.redd.it and v.redd.it from matching.
+_SUBMISSION_ID_RE = re.compile(r"(?:/comments/|(?<![\w.])redd\.it/)([a-z0-9]+)")
+
+# Plain literals, one of which every _PROBLEM_RE match contains. Checking these
+# with `in` first lets text without any indicator skip the regex entirely.
+_PROBLEM_NEEDLES = (
+    "frustrated", "annoying", "hate", "sucks", "broken", "doesn't work", "wish",
+    "need", "want", "struggle", "difficult", "pain", "problem", "issue", "bug", "glitch",
+    "why isn't there", "why doesn't", "how do i", "can anyone help", "does anyone else",
+    "looking for", "searching for",
+    "unable to", "cannot", "cant", "hard to", "impossible", "tired of", "fed up with",
+)
+
+def extract_problem_keywords(*texts: str) -> tuple[str, ...]:
+    """Extract potential problem indicators from one or more texts"""
+    # Collect unique keywords in order of appearance, stopping once there are 10
+    seen = {}
+    for text in texts:
+        text_lower = text.lower()
+        if not any(needle in text_lower for needle in _PROBLEM_NEEDLES):
+            continue
+        for match in _PROBLEM_RE.finditer(text_lower):
+            keyword = match.group(1)
+            if keyword not in seen:
+                seen[keyword] = None
+                if len(seen) == 10:
+                    return tuple(seen)
+    return tuple(seen)
+
+# Keywords of recently seen comment bodies, keyed on a 16-byte digest of the
+# body so the cache never keeps the comment text itself alive
+_comment_keyword_cache: OrderedDict[bytes, tuple[str, ...]] = OrderedDict()
+
+def extract_comment_keywords(body: str) -> tuple[str, ...]:
+    """Extract problem indicators from a comment body, memoized for quoted and reposted comments"""
+    key = hashlib.blake2b(body.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    keywords = _comment_keyword_cache.get(key)
+    if keywords is None:
+        keywords = extract_problem_keywords(body)
+        _comment_keyword_cache[key] = keywords
+        if len(_comment_keyword_cache) > COMMENT_KEYWORD_CACHE_SIZE:
+            _comment_keyword_cache.popitem(last=False)
+    else:
+        _comment_keyword_cache.move_to_end(key)
+    return keywords
+
+def _clip(text: str, limit: int) -> str:
+    """Truncate text to limit characters, marking the cut with an ellipsis"""
+    return text if len(text) <= limit else text[:limit] + "..."
+
+# Cached post keywords: (post id, edited timestamp, TTL bucket) -> keywords.
+# Analysis can run on worker threads as well as the event loop, hence the lock.
+_post_keyword_cache: OrderedDict[tuple[str, Any, int], tuple[str, ...]] = OrderedDict()
+_post_keyword_cache_lock = threading.Lock()
+
+def post_problem_keywords(post: Any) -> tuple[str, ...]:
+    """Extract problem indicators from a post's title and body, reusing recent results for the same post version"""
+    key = (post.id, getattr(post, 'edited', False), int(time.time() // POST_KEYWORD_CACHE_TTL))
+    with _post_keyword_cache_lock:
+        keywords = _post_keyword_cache.get(key)
+        if keywords is not None:
+            _post_keyword_cache.move_to_end(key)
+    if keywords is None:
+        keywords = extract_problem_keywords(post.title, post.selftext if hasattr(post, 'selftext') else "")
+        with _post_keyword_cache_lock:
+            _post_keyword_cache[key] = keywords
+            if len(_post_keyword_cache) > POST_KEYWORD_CACHE_SIZE:
+                _post_keyword_cache.popitem(last=False)
+    return keywords
 
 def analyze_post_for_problems(post: Any) -> dict:
     """Analyze a Reddit post for problem indicators"""
-    title = post.title
     selftext = post.selftext if hasattr(post, 'selftext') else ""
-    combined_text = f"{title} {selftext}"
-    
-    problem_keywords = extract_problem_keywords(combined_text)
+    problem_keywords = post_problem_keywords(post)
     score = post.score
     num_comments = post.num_comments
-    created_utc = datetime.fromtimestamp(post.created_utc)
     
     # Calculate problem score (higher = more likely a problem)
     problem_score = len(problem_keywords) + (score / 100) + (num_comments / 50)
     
     return {
-        "title": title,
-        "text": selftext[:500] + "..." if len(selftext) > 500 else selftext,
+        "title": post.title,
+        "text": _clip(selftext, 500),
         "url": f"https://reddit.com{post.permalink}",
         "subreddit": str(post.subreddit),
         "score": score,
         "comments": num_comments,
-        "created": created_utc.isoformat(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(post.created_utc)),
         "problem_keywords": problem_keywords,
         "problem_score": round(problem_score, 2),
         "author": str(post.author) if post.author else "[deleted]",
     }
 
-@app.list_tools()
-async def list_tools() -> list[Tool]:
-    """List available tools for Reddit problem discovery"""
-    return [
-        Tool(
-            name="search_reddit_problems",
-            description="Search Reddit for posts that likely indicate problems or unmet needs. Searches Reddit posts and returns results sorted by problem indicators.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": "Search query to find problem-related posts"
-                    },
-                    "subreddit": {
-                        "type": "string",
-                        "description": "Optional: Limit search to a specific subreddit"
-                    },
-                    "limit": {
-                        "type": "integer",
-                        "description": "Number of posts to return (default: 20, max: 100)",
-                        "default": 20
-                    },
-                    "sort": {
-                        "type": "string",
-                        "description": "Sort order: 'relevance', 'hot', 'top', 'new', 'comments'",
-                        "enum": ["relevance", "hot", "top", "new", "comments"],
-                        "default": "relevance"
-                    },
-                    "time_filter": {
-                        "type": "string",
-                        "description": "Time filter for 'top' sort: 'hour', 'day', 'week', 'month', 'year', 'all'",
-                        "enum": ["hour", "day", "week", "month", "year", "all"],
-                        "default": "week"
-                    }
+def top_problem_keywords(analyses: Iterable[dict], n: int) -> list[tuple[str, int]]:
+    """Count problem keywords across analyzed posts and return the n most common"""
+    counts = Counter()
+    for analysis in analyses:
+        counts.update(analysis["problem_keywords"])
+    return counts.most_common(n)
+
+# Tools exposed by this server
+TOOLS = [
+    Tool(
+        name="search_reddit_problems",
+        description="Search Reddit for posts that likely indicate problems or unmet needs. Searches Reddit posts and returns results sorted by problem indicators.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "Search query to find problem-related posts"
                 },
-                "required": ["query"]
-            }
-        ),
-        Tool(
-            name="analyze_subreddit_problems",
-            description="Analyze a subreddit to identify common problems, pain points, and unmet needs discussed by the community. Returns aggregated insights.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "subreddit": {
-                        "type": "string",
-                        "description": "Name of the subreddit to analyze (without r/)"
-                    },
-                    "limit": {
-                        "type": "integer",
-                        "description": "Number of posts to analyze (default: 50, max: 100)",
-                        "default": 50
-                    },
-                    "sort": {
-                        "type": "string",
-                        "description": "Sort order: 'hot', 'top', 'new', 'rising'",
-                        "enum": ["hot", "top", "new", "rising"],
-                        "default": "top"
-                    },
-                    "time_filter": {
-                        "type": "string",
-                        "description": "Time filter for analysis: 'hour', 'day', 'week', 'month', 'year', 'all'",
-                        "enum": ["hour", "day", "week", "month", "year", "all"],
-                        "default": "week"
-                    }
+                "subreddit": {
+                    "type": "string",
+                    "description": "Optional: Limit search to a specific subreddit"
                 },
-                "required": ["subreddit"]
-            }
-        ),
-        Tool(
-            name="get_trending_problems",
-            description="Get trending discussions across Reddit that indicate problems or pain points. Focuses on posts with high engagement.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "subreddits": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "description": "Optional: List of subreddits to search (without r/). If empty, searches all of Reddit."
-                    },
-                    "limit": {
-                        "type": "integer",
-                        "description": "Number of posts to return (default: 30, max: 100)",
-                        "default": 30
-                    },
-                    "min_score": {
-                        "type": "integer",
-                        "description": "Minimum upvote score (default: 10)",
-                        "default": 10
-                    },
-                    "min_comments": {
-                        "type": "integer",
-                        "description": "Minimum number of comments (default: 5)",
-                        "default": 5
-                    }
+                "limit": {
+                    "type": "integer",
+                    "description": "Number of posts to return (default: 20, max: 100)",
+                    "default": 20
+                },
+                "sort": {
+                    "type": "string",
+                    "description": "Sort order: 'relevance', 'hot', 'top', 'new', 'comments'",
+                    "enum": ["relevance", "hot", "top", "new", "comments"],
+                    "default": "relevance"
+                },
+                "time_filter": {
+                    "type": "string",
+                    "description": "Time filter for 'top' sort: 'hour', 'day', 'week', 'month', 'year', 'all'",
+                    "enum": ["hour", "day", "week", "month", "year", "all"],
+                    "default": "week"
                 }
-            }
-        ),
-        Tool(
-            name="get_startup_ideas_from_post",
-            description="Analyze a specific Reddit post (by URL) to extract potential startup ideas and problem-solution opportunities.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "post_url": {
-                        "type": "string",
-                        "description": "Full URL or permalink to the Reddit post"
-                    },
-                    "include_comments": {
-                        "type": "boolean",
-                        "description": "Include top comments in analysis (default: true)",
-                        "default": True
-                    },
-                    "comment_limit": {
-                        "type": "integer",
-                        "description": "Number of top comments to analyze (default: 20)",
-                        "default": 20
-                    }
+            },
+            "required": ["query"]
+        }
+    ),
+    Tool(
+        name="analyze_subreddit_problems",
+        description="Analyze a subreddit to identify common problems, pain points, and unmet needs discussed by the community. Returns aggregated insights.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "subreddit": {
+                    "type": "string",
+                    "description": "Name of the subreddit to analyze (without r/)"
                 },
-                "required": ["post_url"]
-            }
-        ),
-        Tool(
-            name="discover_problem_patterns",
-            description="Discover recurring problem patterns across multiple subreddits or search queries. Helps identify widespread problems that could be startup opportunities.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "queries": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "description": "List of search queries to analyze for common patterns"
-                    },
-                    "subreddits": {
-                        "type": "array",
-                        "items": {"type": "string"},
-                        "description": "Optional: List of subreddits to limit search to"
-                    },
-                    "posts_per_query": {
-                        "type": "integer",
-                        "description": "Number of posts to analyze per query (default: 10)",
-                        "default": 10
-                    }
+                "limit": {
+                    "type": "integer",
+                    "description": "Number of posts to analyze (default: 50, max: 100)",
+                    "default": 50
                 },
-                "required": ["queries"]
+                "sort": {
+                    "type": "string",
+                    "description": "Sort order: 'hot', 'top', 'new', 'rising'",
+                    "enum": ["hot", "top", "new", "rising"],
+                    "default": "top"
+                },
+                "time_filter": {
+                    "type": "string",
+                    "description": "Time filter for analysis: 'hour', 'day', 'week', 'month', 'year', 'all'",
+                    "enum": ["hour", "day", "week", "month", "year", "all"],
+                    "default": "week"
+                },
+                "include_all": {
+                    "type": "boolean",
+                    "description": "Also return every analyzed post, not just the top 10 (default: false)",
+                    "default": False
+                }
+            },
+            "required": ["subreddit"]
+        }
+    ),
+    Tool(
+        name="get_trending_problems",
+        description="Get trending discussions across Reddit that indicate problems or pain points. Focuses on posts with high engagement.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "subreddits": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Optional: List of subreddits to search (without r/). If empty, searches all of Reddit."
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Number of posts to return (default: 30, max: 100)",
+                    "default": 30
+                },
+                "min_score": {
+                    "type": "integer",
+                    "description": "Minimum upvote score (default: 10)",
+                    "default": 10
+                },
+                "min_comments": {
+                    "type": "integer",
+                    "description": "Minimum number of comments (default: 5)",
+                    "default": 5
+                }
             }
-        )
-    ]
+        }
+    ),
+    Tool(
+        name="get_startup_ideas_from_post",
+        description="Analyze a specific Reddit post (by URL) to extract potential startup ideas and problem-solution opportunities.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "post_url": {
+                    "type": "string",
+                    "description": "Full URL, permalink, or redd.it short link to the Reddit post"
+                },
+                "include_comments": {
+                    "type": "boolean",
+                    "description": "Include top comments in analysis (default: true)",
+                    "default": True
+                },
+                "comment_limit": {
+                    "type": "integer",
+                    "description": "Number of top comments to analyze (default: 20)",
+                    "default": 20
+                }
+            },
+            "required": ["post_url"]
+        }
+    ),
+    Tool(
+        name="discover_problem_patterns",
+        description="Discover recurring problem patterns across multiple subreddits or search queries. Helps identify widespread problems that could be startup opportunities.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "queries": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "List of search queries to analyze for common patterns"
+                },
+                "subreddits": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Optional: List of subreddits to limit search to"
+                },
+                "posts_per_query": {
+                    "type": "integer",
+                    "description": "Number of posts to analyze per query (default: 10)",
+                    "default": 10
+                }
+            },
+            "required": ["queries"]
+        }
+    )
+]
 
-@app.call_tool()
-async def call_tool(name: str, arguments: dict) -> list[TextContent]:
-    """Handle tool calls"""
-    reddit = get_reddit_client()
+# Argument schema for each tool, used to normalize cache keys
+_TOOL_PROPERTIES = {tool.name: tool.inputSchema["properties"] for tool in TOOLS}
+
+@app.list_tools()
+async def list_tools() -> list[Tool]:
+    """List available tools for Reddit problem discovery"""
+    return TOOLS
+
+def _dumps(obj: Any) -> str:
+    """Serialize a tool response as indented JSON, using orjson when it is installed"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+        except orjson.JSONEncodeError:
+            # orjson rejects strings with lone surrogates; json escapes them
+            pass
+    return json.dumps(obj, indent=2)
+
+# Cached tool results: (tool name, normalized arguments) -> (expiry time, result)
+_tool_cache: dict[tuple[str, str], tuple[float, list[TextContent]]] = {}
+
+def _tool_cache_key(name: str, arguments: dict) -> tuple[str, str] | None:
+    """Build a cache key from the tool's schema arguments, with defaults filled in"""
+    properties = _TOOL_PROPERTIES.get(name)
+    if properties is None:
+        return None
+    normalized = {key: arguments.get(key, spec.get("default")) for key, spec in properties.items()}
+    return name, json.dumps(normalized, sort_keys=True)
+
+def _get_cached_tool_result(key: tuple[str, str] | None) -> list[TextContent] | None:
+    """Return the cached result for key if it has not expired"""
+    entry = _tool_cache.get(key) if key is not None else None
+    if entry is None:
+        return None
+    expires_at, result = entry
+    if expires_at <= time.monotonic():
+        del _tool_cache[key]
+        return None
+    return result
+
+def _cache_tool_result(key: tuple[str, str], result: list[TextContent]) -> None:
+    """Store a tool result, evicting expired and then oldest entries when full"""
+    now = time.monotonic()
+    _tool_cache.pop(key, None)
+    if len(_tool_cache) >= TOOL_CACHE_SIZE:
+        for stale_key in [k for k, (expires_at, _) in _tool_cache.items() if expires_at <= now]:
+            del _tool_cache[stale_key]
+        if len(_tool_cache) >= TOOL_CACHE_SIZE:
+            del _tool_cache[next(iter(_tool_cache))]
+    _tool_cache[key] = (now + TOOL_CACHE_TTL, result)
+
+async def _dispatch_tool(name: str, arguments: dict) -> tuple[list[TextContent], bool]:
+    """Run the named tool against Reddit; return its response and whether it may be cached"""
+    # Responses are not cacheable when a fetch failed and was skipped, or when
+    # the request itself was invalid
+    if name == "search_reddit_problems":
+        query = arguments.get("query")
+        subreddit_name = arguments.get("subreddit")
+        limit = min(arguments.get("limit", 20), 100)
+        sort = arguments.get("sort", "relevance")
+        time_filter = arguments.get("time_filter", "week")
+        
+        subreddit = subreddit_name or "all"
+        
+        # Use async wrapper for Reddit API calls
+        if sort == "relevance":
+            posts = await fetch_posts_async(subreddit, "search", limit, query=query, sort=sort)
+        elif sort == "top":
+            posts = await fetch_posts_async(subreddit, "top", limit, time_filter=time_filter)
+        elif sort == "hot":
+            posts = await fetch_posts_async(subreddit, "hot", limit)
+        elif sort == "new":
+            posts = await fetch_posts_async(subreddit, "new", limit)
+        else:  # comments
+            posts = await fetch_posts_async(subreddit, "search", limit, query=query, sort="comments")
+        
+        results = [analyze_post_for_problems(post) for post in posts]
+        top_results = heapq.nlargest(limit, results, key=itemgetter("problem_score"))
+        
+        return [TextContent(
+            type="text",
+            text=_dumps({
+                "query": query,
+                "subreddit": subreddit_name or "all",
+                "results_count": len(results),
+                "posts": top_results
+            })
+        )], True
     
-    try:
-        if name == "search_reddit_problems":
-            query = arguments.get("query")
-            subreddit_name = arguments.get("subreddit")
-            limit = min(arguments.get("limit", 20), 100)
-            sort = arguments.get("sort", "relevance")
-            time_filter = arguments.get("time_filter", "week")
-            
-            subreddit = reddit.subreddit(subreddit_name or "all")
-            
-            # Use async wrapper for Reddit API calls
-            if sort == "relevance":
-                posts = await fetch_posts_async(subreddit, "search", limit, query=query, sort=sort)
-            elif sort == "top":
-                posts = await fetch_posts_async(subreddit, "top", limit, time_filter=time_filter)
-            elif sort == "hot":
-                posts = await fetch_posts_async(subreddit, "hot", limit)
-            elif sort == "new":
-                posts = await fetch_posts_async(subreddit, "new", limit)
-            else:  # comments
-                posts = await fetch_posts_async(subreddit, "search", limit, query=query, sort="comments")
-            
-            results = [analyze_post_for_problems(post) for post in posts]
-            results.sort(key=lambda x: x["problem_score"], reverse=True)
-            
-            return [TextContent(
-                type="text",
-                text=json.dumps({
-                    "query": query,
-                    "subreddit": subreddit_name or "all",
-                    "results_count": len(results),
-                    "posts": results[:limit]
-                }, indent=2)
-            )]
+    elif name == "analyze_subreddit_problems":
+        subreddit_name = arguments.get("subreddit")
+        limit = min(arguments.get("limit", 50), 100)
+        sort = arguments.get("sort", "top")
+        time_filter = arguments.get("time_filter", "week")
+        include_all = arguments.get("include_all", False)
         
-        elif name == "analyze_subreddit_problems":
-            subreddit_name = arguments.get("subreddit")
-            limit = min(arguments.get("limit", 50), 100)
-            sort = arguments.get("sort", "top")
-            time_filter = arguments.get("time_filter", "week")
-            
-            subreddit = reddit.subreddit(subreddit_name)
-            
-            # Use async wrapper for Reddit API calls
-            if sort == "top":
-                posts = await fetch_posts_async(subreddit, "top", limit, time_filter=time_filter)
-            elif sort == "hot":
-                posts = await fetch_posts_async(subreddit, "hot", limit)
-            elif sort == "new":
-                posts = await fetch_posts_async(subreddit, "new", limit)
-            else:  # rising
-                posts = await fetch_posts_async(subreddit, "rising", limit)
-            
-            analyzed_posts = [analyze_post_for_problems(post) for post in posts]
-            analyzed_posts.sort(key=lambda x: x["problem_score"], reverse=True)
-            
-            # Aggregate insights
-            all_keywords = []
-            for post in analyzed_posts:
-                all_keywords.extend(post["problem_keywords"])
-            
-            keyword_counts = {}
-            for keyword in all_keywords:
-                keyword_counts[keyword] = keyword_counts.get(keyword, 0) + 1
-            
-            top_keywords = sorted(keyword_counts.items(), key=lambda x: x[1], reverse=True)[:10]
-            
-            avg_score = sum(p["score"] for p in analyzed_posts) / len(analyzed_posts) if analyzed_posts else 0
-            avg_comments = sum(p["comments"] for p in analyzed_posts) / len(analyzed_posts) if analyzed_posts else 0
-            
-            return [TextContent(
-                type="text",
-                text=json.dumps({
-                    "subreddit": subreddit_name,
-                    "analysis_summary": {
-                        "posts_analyzed": len(analyzed_posts),
-                        "average_score": round(avg_score, 2),
-                        "average_comments": round(avg_comments, 2),
-                        "top_problem_keywords": [{"keyword": k, "frequency": v} for k, v in top_keywords],
-                        "top_problem_posts": analyzed_posts[:10]
-                    },
-                    "all_posts": analyzed_posts
-                }, indent=2)
-            )]
+        # Use async wrapper for Reddit API calls
+        if sort == "top":
+            posts = await fetch_posts_async(subreddit_name, "top", limit, time_filter=time_filter)
+        elif sort == "hot":
+            posts = await fetch_posts_async(subreddit_name, "hot", limit)
+        elif sort == "new":
+            posts = await fetch_posts_async(subreddit_name, "new", limit)
+        else:  # rising
+            posts = await fetch_posts_async(subreddit_name, "rising", limit)
         
-        elif name == "get_trending_problems":
-            subreddits = arguments.get("subreddits", [])
-            limit = min(arguments.get("limit", 30), 100)
-            min_score = arguments.get("min_score", 10)
-            min_comments = arguments.get("min_comments", 5)
-            
-            all_posts = []
-            
-            if subreddits:
-                for subreddit_name in subreddits:
-                    try:
-                        subreddit = reddit.subreddit(subreddit_name)
-                        posts = await fetch_posts_async(subreddit, "hot", limit // len(subreddits) + 5)
-                        all_posts.extend(posts)
-                    except Exception as e:
-                        continue
-            else:
-                # Get from r/all
-                all_subreddit = reddit.subreddit("all")
-                all_posts = await fetch_posts_async(all_subreddit, "hot", limit * 2)
-            
-            # Filter and analyze
-            filtered_posts = [
-                p for p in all_posts 
-                if p.score >= min_score and p.num_comments >= min_comments
-            ]
-            
-            analyzed_posts = [analyze_post_for_problems(post) for post in filtered_posts]
-            analyzed_posts.sort(key=lambda x: x["problem_score"], reverse=True)
-            
+        analyzed_posts = [analyze_post_for_problems(post) for post in posts]
+        # Keyword ties are broken by post order, so count over the score-sorted
+        # list whether or not it is returned
+        analyzed_posts.sort(key=itemgetter("problem_score"), reverse=True)
+        top_posts = analyzed_posts[:10]
+        
+        # Aggregate insights
+        top_keywords = top_problem_keywords(analyzed_posts, 10)
+        
+        avg_score = sum(p["score"] for p in analyzed_posts) / len(analyzed_posts) if analyzed_posts else 0
+        avg_comments = sum(p["comments"] for p in analyzed_posts) / len(analyzed_posts) if analyzed_posts else 0
+        
+        response = {
+            "subreddit": subreddit_name,
+            "analysis_summary": {
+                "posts_analyzed": len(analyzed_posts),
+                "average_score": round(avg_score, 2),
+                "average_comments": round(avg_comments, 2),
+                "top_problem_keywords": [{"keyword": k, "frequency": v} for k, v in top_keywords],
+                "top_problem_posts": top_posts
+            }
+        }
+        # The full post list roughly doubles the payload, so only send it on request
+        if include_all:
+            response["all_posts"] = analyzed_posts
+        
+        return [TextContent(
+            type="text",
+            text=_dumps(response)
+        )], True
+    
+    elif name == "get_trending_problems":
+        subreddits = arguments.get("subreddits", [])
+        limit = min(arguments.get("limit", 30), 100)
+        min_score = arguments.get("min_score", 10)
+        min_comments = arguments.get("min_comments", 5)
+        
+        all_posts = []
+        failed_fetches = 0
+        
+        if subreddits:
+            # Fetch all subreddits concurrently
+            per_subreddit = limit // len(subreddits) + 5
+            fetches = await asyncio.gather(
+                *(fetch_posts_async(s, "hot", per_subreddit) for s in subreddits),
+                return_exceptions=True
+            )
+            for posts in fetches:
+                # Skip subreddits that failed to load
+                if isinstance(posts, Exception):
+                    failed_fetches += 1
+                else:
+                    all_posts.extend(posts)
+        else:
+            # Get from r/all
+            all_posts = await fetch_posts_async("all", "hot", limit * 2)
+        
+        # Filter on engagement and drop posts without any problem keyword before
+        # building analyses; the keywords are cached, so analysis reuses them
+        filtered_posts = [
+            p for p in all_posts 
+            if p.score >= min_score and p.num_comments >= min_comments
+            and post_problem_keywords(p)
+        ]
+        
+        analyzed_posts = [analyze_post_for_problems(post) for post in filtered_posts]
+        trending_posts = heapq.nlargest(limit, analyzed_posts, key=itemgetter("problem_score"))
+        
+        return [TextContent(
+            type="text",
+            text=_dumps({
+                "scope": subreddits if subreddits else "all",
+                "filters": {
+                    "min_score": min_score,
+                    "min_comments": min_comments
+                },
+                "results_count": len(analyzed_posts),
+                "trending_problems": trending_posts
+            })
+        )], not failed_fetches
+    
+    elif name == "get_startup_ideas_from_post":
+        post_url = arguments.get("post_url")
+        include_comments = arguments.get("include_comments", True)
+        comment_limit = arguments.get("comment_limit", 20)
+        
+        # Extract submission ID from URL
+        match = _SUBMISSION_ID_RE.search(post_url)
+        submission_id = match.group(1) if match else None
+        
+        if not submission_id:
             return [TextContent(
                 type="text",
-                text=json.dumps({
-                    "scope": subreddits if subreddits else "all",
-                    "filters": {
-                        "min_score": min_score,
-                        "min_comments": min_comments
-                    },
-                    "results_count": len(analyzed_posts),
-                    "trending_problems": analyzed_posts[:limit]
-                }, indent=2)
-            )]
+                text=_dumps({"error": "Invalid Reddit post URL"})
+            )], False
         
-        elif name == "get_startup_ideas_from_post":
-            post_url = arguments.get("post_url")
-            include_comments = arguments.get("include_comments", True)
-            comment_limit = arguments.get("comment_limit", 20)
-            
-            # Extract submission ID from URL
-            submission_id = None
-            if "/comments/" in post_url:
-                parts = post_url.split("/comments/")
-                if len(parts) > 1:
-                    submission_id = parts[1].split("/")[0]
-            
-            if not submission_id:
-                return [TextContent(
-                    type="text",
-                    text=json.dumps({"error": "Invalid Reddit post URL"}, indent=2)
-                )]
-            
-            # Fetch submission asynchronously
-            def get_submission_sync():
-                return reddit.submission(id=submission_id)
-            
-            submission = await run_blocking(get_submission_sync)
+        # PRAW submissions are lazy: the HTTP fetch happens on first attribute
+        # access, so analyze inside the worker to keep it off the event loop.
+        # Comments are fetched in the same call so the submission is only ever
+        # used by the thread whose client created it.
+        def fetch_submission_sync():
+            submission = get_reddit_client().submission(id=submission_id)
             post_analysis = analyze_post_for_problems(submission)
-            
-            insights = {
-                "post": post_analysis,
-                "potential_problems": post_analysis["problem_keywords"],
-                "startup_opportunities": []
-            }
-            
+            top_comments = []
             if include_comments:
-                # Replace "more comments" and fetch asynchronously
-                def fetch_comments_sync():
-                    submission.comments.replace_more(limit=0)
-                    return submission.comments.list()[:comment_limit]
-                
-                top_comments = await run_blocking(fetch_comments_sync)
-                
-                comment_insights = []
-                for comment in top_comments:
-                    if hasattr(comment, 'body') and comment.body and comment.body != "[deleted]":
-                        comment_keywords = extract_problem_keywords(comment.body)
-                        if comment_keywords:
-                            comment_insights.append({
-                                "text": comment.body[:300] + "..." if len(comment.body) > 300 else comment.body,
-                                "score": comment.score,
-                                "problem_keywords": comment_keywords
-                            })
-                
-                insights["top_comments"] = comment_insights
-                
-                # Aggregate insights
-                all_problem_keywords = post_analysis["problem_keywords"].copy()
-                for comment in comment_insights:
-                    all_problem_keywords.extend(comment["problem_keywords"])
-                
-                keyword_freq = {}
-                for keyword in all_problem_keywords:
-                    keyword_freq[keyword] = keyword_freq.get(keyword, 0) + 1
-                
-                top_problems = sorted(keyword_freq.items(), key=lambda x: x[1], reverse=True)[:5]
-                
-                insights["aggregated_problems"] = [
-                    {"problem_indicator": k, "mentions": v} 
-                    for k, v in top_problems
-                ]
-                
-                startup_opps = []
-                for prob in insights["aggregated_problems"]:
-                    startup_opps.append(f"Problem: {prob['problem_indicator']} (mentioned {prob['mentions']} times)")
-                    startup_opps.append(f"Opportunity: Build a solution addressing '{prob['problem_indicator']}' mentioned in r/{post_analysis['subreddit']}")
-                insights["startup_opportunities"] = startup_opps
-            
-            return [TextContent(
-                type="text",
-                text=json.dumps(insights, indent=2)
-            )]
+                # Replace "more comments" before flattening the comment tree
+                submission.comments.replace_more(limit=0)
+                top_comments = submission.comments.list()[:comment_limit]
+            return post_analysis, top_comments
         
-        elif name == "discover_problem_patterns":
-            queries = arguments.get("queries")
-            subreddits = arguments.get("subreddits", [])
-            posts_per_query = arguments.get("posts_per_query", 10)
-            
-            all_posts = []
-            
-            search_scope = subreddits if subreddits else ["all"]
-            
-            for query in queries:
-                for subreddit_name in search_scope:
-                    try:
-                        if subreddit_name == "all":
-                            all_subreddit = reddit.subreddit("all")
-                            posts = await fetch_posts_async(all_subreddit, "search", posts_per_query, query=query)
-                        else:
-                            subreddit = reddit.subreddit(subreddit_name)
-                            posts = await fetch_posts_async(subreddit, "search", posts_per_query, query=query)
-                        
-                        for post in posts:
-                            analysis = analyze_post_for_problems(post)
-                            analysis["source_query"] = query
-                            analysis["source_subreddit"] = subreddit_name
-                            all_posts.append(analysis)
-                    except Exception as e:
-                        continue
-            
-            # Find patterns
-            all_keywords = []
-            for post in all_posts:
-                all_keywords.extend(post["problem_keywords"])
-            
-            keyword_patterns = {}
-            for keyword in all_keywords:
-                keyword_patterns[keyword] = keyword_patterns.get(keyword, 0) + 1
-            
-            top_patterns = sorted(keyword_patterns.items(), key=lambda x: x[1], reverse=True)[:15]
-            
-            # Group by subreddit
-            subreddit_groups = {}
-            for post in all_posts:
-                sub = post["subreddit"]
-                if sub not in subreddit_groups:
-                    subreddit_groups[sub] = []
-                subreddit_groups[sub].append(post)
+        post_analysis, top_comments = await run_blocking(fetch_submission_sync)
+        
+        insights = {
+            "post": post_analysis,
+            "potential_problems": post_analysis["problem_keywords"],
+            "startup_opportunities": []
+        }
+        
+        if include_comments:
+            # Collect comment insights and aggregate keywords in a single pass
+            comment_insights = []
+            keyword_freq = Counter(post_analysis["problem_keywords"])
+            for comment in top_comments:
+                body = getattr(comment, 'body', None)
+                if body and body != "[deleted]":
+                    comment_keywords = extract_comment_keywords(body)
+                    if comment_keywords:
+                        comment_insights.append({
+                            "text": _clip(body, 300),
+                            "score": comment.score,
+                            "problem_keywords": comment_keywords
+                        })
+                        keyword_freq.update(comment_keywords)
+            
+            insights["top_comments"] = comment_insights
+            
+            top_problems = keyword_freq.most_common(5)
+            
+            insights["aggregated_problems"] = [
+                {"problem_indicator": k, "mentions": v} 
+                for k, v in top_problems
+            ]
             
-            return [TextContent(
-                type="text",
-                text=json.dumps({
-                    "queries_analyzed": queries,
-                    "posts_analyzed": len(all_posts),
-                    "recurring_problem_patterns": [
-                        {"pattern": k, "frequency": v, "percentage": round(v / len(all_posts) * 100, 2)}
-                        for k, v in top_patterns
-                    ],
-                    "problems_by_subreddit": {
-                        sub: {
-                            "count": len(posts),
-                            "top_problems": sorted(
-                                [p for p in posts],
-                                key=lambda x: x["problem_score"],
-                                reverse=True
-                            )[:5]
-                        }
-                        for sub, posts in subreddit_groups.items()
-                    },
-                    "potential_startup_ideas": [
-                        {
-                            "problem": pattern[0],
-                            "frequency": pattern[1],
-                            "potential_impact": "high" if pattern[1] >= len(all_posts) * 0.1 else "medium" if pattern[1] >= len(all_posts) * 0.05 else "low"
-                        }
-                        for pattern in top_patterns[:5]
-                    ]
-                }, indent=2)
-            )]
+            startup_opps = []
+            for prob in insights["aggregated_problems"]:
+                startup_opps.append(f"Problem: {prob['problem_indicator']} (mentioned {prob['mentions']} times)")
+                startup_opps.append(f"Opportunity: Build a solution addressing '{prob['problem_indicator']}' mentioned in r/{post_analysis['subreddit']}")
+            insights["startup_opportunities"] = startup_opps
         
-        else:
-            return [TextContent(
-                type="text",
-                text=json.dumps({"error": f"Unknown tool: {name}"}, indent=2)
-            )]
+        return [TextContent(
+            type="text",
+            text=_dumps(insights)
+        )], True
     
+    elif name == "discover_problem_patterns":
+        queries = arguments.get("queries")
+        subreddits = arguments.get("subreddits", [])
+        posts_per_query = arguments.get("posts_per_query", 10)
+        
+        all_posts = []
+        failed_fetches = 0
+        
+        search_scope = subreddits if subreddits else ["all"]
+        
+        # Run every (query, subreddit) search concurrently
+        searches = [(query, subreddit_name) for query in queries for subreddit_name in search_scope]
+        fetches = await asyncio.gather(
+            *(fetch_posts_async(subreddit_name, "search", posts_per_query, query=query)
+              for query, subreddit_name in searches),
+            return_exceptions=True
+        )
+        
+        for (query, subreddit_name), posts in zip(searches, fetches):
+            # Skip searches that failed
+            if isinstance(posts, Exception):
+                failed_fetches += 1
+                continue
+            for post in posts:
+                analysis = analyze_post_for_problems(post)
+                analysis["source_query"] = query
+                analysis["source_subreddit"] = subreddit_name
+                all_posts.append(analysis)
+        
+        # Find patterns
+        top_patterns = top_problem_keywords(all_posts, 15)
+        total_posts = len(all_posts)
+        high_impact = total_posts * 0.1
+        medium_impact = total_posts * 0.05
+        
+        # Group by subreddit; a single sort leaves each group's best posts first
+        all_posts.sort(key=lambda p: (p["subreddit"], -p["problem_score"]))
+        problems_by_subreddit = {}
+        for sub, group in groupby(all_posts, key=itemgetter("subreddit")):
+            posts = list(group)
+            problems_by_subreddit[sub] = {"count": len(posts), "top_problems": posts[:5]}
+        
+        return [TextContent(
+            type="text",
+            text=_dumps({
+                "queries_analyzed": queries,
+                "posts_analyzed": total_posts,
+                "recurring_problem_patterns": [
+                    {"pattern": k, "frequency": v, "percentage": round(v / total_posts * 100, 2)}
+                    for k, v in top_patterns
+                ],
+                "problems_by_subreddit": problems_by_subreddit,
+                "potential_startup_ideas": [
+                    {
+                        "problem": pattern[0],
+                        "frequency": pattern[1],
+                        "potential_impact": "high" if pattern[1] >= high_impact else "medium" if pattern[1] >= medium_impact else "low"
+                    }
+                    for pattern in top_patterns[:5]
+                ]
+            })
+        )], not failed_fetches
+    
+    else:
+        return [TextContent(
+            type="text",
+            text=_dumps({"error": f"Unknown tool: {name}"})
+        )], False
+
+@app.call_tool()
+async def call_tool(name: str, arguments: dict) -> list[TextContent]:
+    """Handle tool calls, serving repeated identical calls from a short-lived cache"""
+    cache_key = _tool_cache_key(name, arguments)
+    cached = _get_cached_tool_result(cache_key)
+    if cached is not None:
+        return cached
+    
+    # Fail fast on missing credentials; clients are built lazily on the worker threads
+    get_reddit_credentials()
+    
+    try:
+        result, cacheable = await _dispatch_tool(name, arguments)
     except asyncio.TimeoutError:
         return [TextContent(
             type="text",
-            text=json.dumps({
+            text=_dumps({
                 "error": "Request timed out",
                 "message": f"Reddit API request exceeded {REDDIT_API_TIMEOUT} seconds. Please try again with a smaller limit or more specific query."
-            }, indent=2)
+            })
         )]
     except Exception as e:
         return [TextContent(
             type="text",
-            text=json.dumps({
+            text=_dumps({
                 "error": str(e),
                 "error_type": type(e).__name__
-            }, indent=2)
+            })
         )]
+    
+    # Partial results from failed fetches would otherwise be pinned for the whole TTL
+    if cache_key is not None and cacheable:
+        _cache_tool_result(cache_key, result)
+    return result
 
 async def main():
     """Run the MCP server"""
@@ -605,6 +793,11 @@ async def main():
         # Log error to stderr for debugging
         print(f"Server error: {e}", file=sys.stderr)
         raise
+    finally:
+        # Drop queued fetches once the session ends. This has to happen here:
+        # by the time atexit hooks run, the interpreter has already joined the
+        # pool's workers after they drained the queue.
+        _executor.shutdown(wait=False, cancel_futures=True)
 
 def run():
     """Entry point for the MCP server"""